@@ -1,12 +1,22 @@
 import os
+import re
 import logging
-from flask import Flask, render_template, request, send_file, flash, session, jsonify, redirect, url_for
-from werkzeug.utils import secure_filename
+import secrets
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import suppress
+from datetime import datetime, timedelta
+from flask import Flask, Response, make_response, render_template, request, flash, session, jsonify, redirect, url_for, stream_with_context
 from utils.ppt_processor import process_powerpoint
 import json
+from urllib.parse import unquote
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy import func
+from sqlalchemy.schema import CreateIndex
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -33,12 +43,32 @@ if database_url:
 
 # Configure upload settings
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'pptx'}
+ALLOWED_EXTENSIONS = frozenset({'.pptx'})
+UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_STREAM_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max for streamed uploads
+
+# Whitespace str.strip() removes, for matching card text in SQL
+STRIP_CHARS = ' \t\r\n\v\f'
+
+# Pending review batches older than this are deleted when a new batch is started
+PENDING_BATCH_MAX_AGE = timedelta(days=1)
+
+# Extract flashcards from uploads off the request thread
+UPLOAD_WORKERS = os.cpu_count() or 1
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+# Running plus queued extractions; new uploads are turned away while all slots are taken
+upload_slots = threading.BoundedSemaphore(2 * UPLOAD_WORKERS)
+upload_jobs = {}  # token -> (future, filename, submitted_at) for uploads not yet collected by /review
+upload_jobs_lock = threading.Lock()
+UPLOAD_JOB_TIMEOUT = 5 * 60  # seconds before a still-running extraction is reported as failed
+UPLOAD_JOB_TTL = 30 * 60  # seconds an uncollected upload is kept
+UPLOADS_BUSY_MESSAGE = 'The server is busy processing other presentations. Please try again in a minute.'
+MAX_UPLOAD_JOBS = 100  # oldest uncollected uploads are dropped beyond this
 
 # Initialize the database
 db.init_app(app)
@@ -47,36 +77,127 @@ with app.app_context():
     import models  # Import models after db is initialized
     db.create_all()  # Create tables
 
+@app.cli.command('create-indexes')
+def create_indexes():
+    """Add model indexes missing from tables created before the indexes were declared"""
+    # db.create_all() skips existing tables, so run `flask create-indexes` once after upgrading,
+    # from a single process rather than every worker: on PostgreSQL each build locks its
+    # table for writes, and concurrent IF NOT EXISTS builds can collide
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+    logger.info("Model indexes are up to date")
+
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+
+def shorten_filename(name, limit):
+    """Cut the stem of a filename down to limit characters, keeping its extension"""
+    if len(name) <= limit:
+        return name
+    stem, ext = os.path.splitext(name)
+    return stem[:limit - len(ext)] + ext
+
+def upload_path(filename):
+    """Return a safe name for an uploaded file and where to save it"""
+    # Path separators and anything else outside the allowed set become '_'
+    name = shorten_filename(UNSAFE_FILENAME_CHARS.sub('_', filename), 255)
+    # Random prefix so concurrent uploads of the same name don't share a file; the whole
+    # path component still has to fit the usual 255-byte filename limit
+    prefix = f"{secrets.token_hex(8)}_"
+    return name, f"{UPLOAD_FOLDER}/{prefix}{shorten_filename(name, 255 - len(prefix))}"
+
+def strip_sql(column):
+    """SQL equivalent of str.strip(): plain TRIM() only removes spaces, not newlines or tabs"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.btrim(column, STRIP_CHARS)
+    return func.trim(column, STRIP_CHARS)
+
+def load_pending_flashcards():
+    """Return the flashcards waiting for review in the current session's batch"""
+    from models import PendingFlashcard
+    
+    batch_id = session.get('pending_batch')
+    if not batch_id:
+        return []
+    
+    # Plain column rows; the review page never needs the ORM objects
+    rows = db.session.query(PendingFlashcard.type, PendingFlashcard.front, PendingFlashcard.back).filter_by(
+        batch_id=batch_id
+    ).order_by(PendingFlashcard.idx).all()
+    return [{'type': card_type, 'front': front, 'back': back} for card_type, front, back in rows]
+
+def add_pending_flashcards(flashcards, new_batch=False):
+    """Store flashcards for review server-side, keeping only the batch id in the session"""
+    from models import PendingFlashcard
+    
+    batch_id = session.get('pending_batch')
+    if new_batch or not batch_id:
+        # Replace any batch this session left behind
+        clear_pending_flashcards()
+        
+        # Drop whole batches other sessions abandoned (no rows added since the cutoff), so a
+        # batch still being reviewed never loses its older cards and shifts the review indices
+        stale_batches = db.session.query(PendingFlashcard.batch_id).group_by(PendingFlashcard.batch_id).having(
+            func.max(PendingFlashcard.created_at) < datetime.utcnow() - PENDING_BATCH_MAX_AGE
+        )
+        PendingFlashcard.query.filter(
+            PendingFlashcard.batch_id.in_(stale_batches.scalar_subquery())
+        ).delete(synchronize_session=False)
+        
+        batch_id = secrets.token_urlsafe(12)
+        start = 0
+    else:
+        # Continue after the highest index; the unique (batch_id, idx) index rejects a racing append
+        last_idx = db.session.query(func.max(PendingFlashcard.idx)).filter_by(batch_id=batch_id).scalar()
+        start = 0 if last_idx is None else last_idx + 1
+    
+    db.session.add_all([
+        PendingFlashcard(batch_id=batch_id, idx=start + i, type=card['type'], front=card['front'], back=card['back'])
+        for i, card in enumerate(flashcards)
+    ])
+    db.session.commit()
+    session['pending_batch'] = batch_id
+
+def clear_pending_flashcards():
+    """Delete the current session's pending batch rows (the caller commits, then pops 'pending_batch')"""
+    from models import PendingFlashcard
+    
+    batch_id = session.get('pending_batch')
+    if batch_id:
+        PendingFlashcard.query.filter_by(batch_id=batch_id).delete()
 
 @app.route('/')
 def index():
     from models import Flashcard
     
+    # Load every card in one query, ordered so each presentation's cards are contiguous
+    # (only the rendered columns, as plain rows rather than ORM objects)
+    all_cards = db.session.query(
+        Flashcard.presentation_name, Flashcard.type, Flashcard.front, Flashcard.back, Flashcard.created_at
+    ).order_by(Flashcard.presentation_name, Flashcard.created_at.desc()).all()
+    
     # Check if there are any flashcards in the database
-    has_cards = Flashcard.query.count() > 0
+    has_cards = bool(all_cards)
     
     # Always check for cards, but use param to determine if we should prioritize card view
     show_cards = request.args.get('show_cards', 'false') == 'true' or has_cards
     
     if show_cards:
-        # Get all presentations from the database
-        presentations = db.session.query(Flashcard.presentation_name).distinct().all()
-        presentations = [p[0] for p in presentations]
-        
         # Group flashcards by presentation
         grouped_flashcards = {}
-        for presentation in presentations:
-            # Get cards for this presentation
-            presentation_cards = Flashcard.query.filter_by(presentation_name=presentation).all()
-            grouped_flashcards[presentation] = [card.to_dict() for card in presentation_cards]
+        for presentation_name, card_type, front, back, _ in all_cards:
+            grouped_flashcards.setdefault(presentation_name, []).append({'type': card_type, 'front': front, 'back': back})
+        
+        presentations = list(grouped_flashcards.keys())
         
         # Get total count
-        total_count = Flashcard.query.count()
+        total_count = len(all_cards)
         
-        # For backward compatibility with the JavaScript
-        all_flashcards = [card.to_dict() for card in Flashcard.query.order_by(Flashcard.created_at.desc()).all()]
+        # For backward compatibility with the JavaScript (newest first across all presentations)
+        newest_first = sorted(all_cards, key=lambda row: row.created_at or datetime.min, reverse=True)
+        all_flashcards = [{'type': row.type, 'front': row.front, 'back': row.back} for row in newest_first]
         
         return render_template('index.html', 
                               flashcards=all_flashcards if all_flashcards else None,
@@ -92,6 +213,11 @@ def index():
 @app.route('/upload', methods=['POST'])
 def upload_file():
     logger.debug("Upload request received")
+    
+    # Raw uploads skip the multipart parser and go straight to disk
+    if request.mimetype == 'application/octet-stream':
+        return upload_stream()
+    
     logger.debug(f"Files in request: {request.files}")
     logger.debug(f"Form data: {request.form}")
     logger.debug(f"Request method: {request.method}")
@@ -116,8 +242,7 @@ def upload_file():
     if file and allowed_file(file.filename):
         if file.filename:
             try:
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                filename, filepath = upload_path(file.filename)
                 logger.debug(f"Saving file to: {filepath}")
                 file.save(filepath)
                 logger.debug(f"File saved successfully to {filepath}")
@@ -129,70 +254,231 @@ def upload_file():
             flash('Invalid filename', 'error')
             return render_template('index.html', has_cards=False, show_cards=False)
 
-        try:
-            logging.info(f"Processing file: {filename}")
-            flashcards = process_powerpoint(filepath)
-
-            if os.path.exists(filepath):
-                os.remove(filepath)  # Clean up the uploaded file
-                logger.debug("Cleaned up uploaded file")
-
-            if not flashcards:
-                flash('No educational content found in the presentation. The system looks for vocabulary terms, mathematical formulas, and practice problems.', 'warning')
-                return render_template('index.html')
-
-            # Handle the large session data issue - store only essential info
-            # Trim extra-long definitions to avoid session cookie limit
-            for card in flashcards:
-                # Limit the size of 'back' (definition/answer) to 300 chars if needed
-                if len(card['back']) > 300:
-                    card['back'] = card['back'][:297] + '...'
-                    
-            # Store flashcards in session for review
-            session['pending_flashcards'] = flashcards
-            session['presentation_name'] = filename
-
-            # Count items by type
-            counts = {}
-            for card in flashcards:
-                counts[card['type']] = counts.get(card['type'], 0) + 1
-
-            # Create summary message
-            summary = []
-            type_names = {
-                'vocabulary': 'vocabulary terms',
-                'formula': 'mathematical formulas',
-                'problem': 'practice problems'
-            }
-            for type_key, count in counts.items():
-                if count > 0:
-                    summary.append(f"{count} {type_names[type_key]}")
-
-            summary_text = ', '.join(summary[:-1])
-            if len(summary) > 1:
-                summary_text += f" and {summary[-1]}"
-            else:
-                summary_text = summary[0]
-
-            flash(f'Successfully extracted {summary_text}! Please review and select the flashcards you want to keep.', 'success')
-            
-            # Redirect to the review page
-            return redirect(url_for('review_flashcards'))
-        except Exception as e:
-            logger.error(f"Error processing PowerPoint: {str(e)}")
-            flash('Error processing PowerPoint file. Please ensure the file is not corrupted.', 'error')
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return render_template('index.html')
+        if process_upload(filepath, filename) is None:
+            flash(UPLOADS_BUSY_MESSAGE, 'error')
+            return render_template('index.html', has_cards=False, show_cards=False), 503
+        
+        # The review page asks the browser to retry until the extraction finishes
+        return redirect(url_for('review_flashcards'))
     else:
         flash('Invalid file type. Please upload a .pptx file', 'error')
         return render_template('index.html')
 
+@app.route('/upload_stream', methods=['POST'])
+def upload_stream():
+    """Save a raw (application/octet-stream) upload to disk in chunks"""
+    # Streamed uploads are written straight to disk, so they get a larger limit
+    request.max_content_length = app.config['MAX_STREAM_CONTENT_LENGTH']
+    
+    # request.args is already decoded; only the header needs unquoting
+    original_name = request.args.get('filename') or unquote(request.headers.get('X-Filename', ''))
+    logger.debug(f"Streamed file received: {original_name}")
+    
+    if original_name == '':
+        logger.error("No filename supplied with streamed upload")
+        return jsonify({
+            'success': False,
+            'message': 'No file selected'
+        }), 400
+    
+    if not allowed_file(original_name):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid file type. Please upload a .pptx file'
+        }), 400
+    
+    filename, filepath = upload_path(original_name)
+    try:
+        logger.debug(f"Streaming file to: {filepath}")
+        with open(filepath, 'wb') as f:
+            while chunk := request.stream.read(1 << 20):
+                f.write(chunk)
+        logger.debug(f"File saved successfully to {filepath}")
+    except Exception as e:
+        # Don't leave a partial file behind
+        with suppress(FileNotFoundError):
+            os.remove(filepath)
+        if isinstance(e, RequestEntityTooLarge):
+            raise
+        logger.error(f"Error saving file: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Error saving file: {e}'
+        }), 400
+    
+    token = process_upload(filepath, filename)
+    if token is None:
+        return jsonify({
+            'success': False,
+            'message': UPLOADS_BUSY_MESSAGE
+        }), 503
+    
+    # Script clients poll the status URL, then open the review page
+    return jsonify({
+        'success': True,
+        'token': token,
+        'status_url': url_for('upload_status', token=token),
+        'review_url': url_for('review_flashcards', token=token)
+    }), 202
+
+def process_upload(filepath, filename):
+    """Start extracting flashcards from a saved upload in the background; None if the queue is full"""
+    logging.info(f"Processing file: {filename}")
+    
+    if not upload_slots.acquire(blocking=False):
+        logger.warning(f"Upload queue full, rejecting {filename}")
+        with suppress(FileNotFoundError):
+            os.remove(filepath)
+        return None
+    
+    token = secrets.token_urlsafe(12)
+    now = time.monotonic()
+    with upload_jobs_lock:
+        # Forget any earlier upload from this session that was never reviewed
+        evict_upload_job(session.get('upload_token'))
+        
+        # Drop uploads nobody collected (e.g. script clients that ignore cookies)
+        for old_token, (_, _, submitted_at) in list(upload_jobs.items()):
+            if now - submitted_at > UPLOAD_JOB_TTL:
+                evict_upload_job(old_token)
+        while len(upload_jobs) >= MAX_UPLOAD_JOBS:
+            evict_upload_job(next(iter(upload_jobs)))  # dicts keep insertion order, so this is the oldest
+        
+        future = upload_executor.submit(extract_flashcards, filepath)
+        future.add_done_callback(lambda f: finish_upload_job(f, filepath))
+        upload_jobs[token] = (future, filename, now)
+    session['upload_token'] = token
+    return token
+
+def evict_upload_job(token):
+    """Forget an upload job, cancelling it if it has not started (call with upload_jobs_lock held)"""
+    job = upload_jobs.pop(token, None)
+    if job is not None:
+        # A job that is already running can't be stopped; it keeps its thread until it returns
+        job[0].cancel()
+
+def finish_upload_job(future, filepath):
+    """Free the job's queue slot, and remove the upload if the job was cancelled before it ran"""
+    upload_slots.release()
+    if future.cancelled():
+        with suppress(FileNotFoundError):
+            os.remove(filepath)
+
+def extract_flashcards(filepath):
+    """Run process_powerpoint on a worker thread and remove the upload afterwards"""
+    try:
+        return process_powerpoint(filepath)
+    finally:
+        # Clean up the uploaded file whether or not processing succeeded
+        with suppress(FileNotFoundError):
+            os.remove(filepath)
+            logger.debug("Cleaned up uploaded file")
+
+def collect_upload(token):
+    """Stage the flashcards from a background upload; return a response if there are none yet"""
+    with upload_jobs_lock:
+        job = upload_jobs.get(token)
+    if job is None:
+        if session.get('upload_token') == token:
+            session.pop('upload_token')
+        flash('Your upload is no longer available. Please upload the file again.', 'warning')
+        return redirect(url_for('index'))
+    
+    future, filename, submitted_at = job
+    if not future.done() and time.monotonic() - submitted_at < UPLOAD_JOB_TIMEOUT:
+        # Don't hold the request thread; the client polls (scripts) or reloads (browsers)
+        if 'token' in request.args or request.accept_mimetypes.best == 'application/json':
+            response = jsonify({
+                'success': True,
+                'done': False,
+                'message': 'Still processing your presentation...',
+                'status_url': url_for('upload_status', token=token)
+            })
+        else:
+            flash('Still processing your presentation... this page will refresh automatically.', 'warning')
+            response = make_response(render_template('index.html', has_cards=False, show_cards=False))
+        response.headers['Refresh'] = '2'
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    
+    with upload_jobs_lock:
+        # On timeout this only stops waiting: a running process_powerpoint can't be interrupted,
+        # so it keeps its worker thread and queue slot until it returns
+        evict_upload_job(token)
+    if session.get('upload_token') == token:
+        session.pop('upload_token')
+    
+    try:
+        # Done already, unless it has run past the timeout
+        flashcards = future.result(timeout=0)
+    except FuturesTimeoutError:
+        logger.error(f"Timed out processing PowerPoint: {filename}")
+        flash('Processing the PowerPoint file took too long. Please try a smaller presentation.', 'error')
+        return redirect(url_for('index'))
+    except Exception as e:
+        logger.error(f"Error processing PowerPoint: {str(e)}")
+        flash('Error processing PowerPoint file. Please ensure the file is not corrupted.', 'error')
+        return redirect(url_for('index'))
+
+    if not flashcards:
+        flash('No educational content found in the presentation. The system looks for vocabulary terms, mathematical formulas, and practice problems.', 'warning')
+        return redirect(url_for('index'))
+
+    # Store flashcards in the database for review; the session only keeps the batch id
+    add_pending_flashcards(flashcards, new_batch=True)
+    session['presentation_name'] = filename
+
+    # Count items by type
+    counts = Counter(card['type'] for card in flashcards)
+
+    # Create summary message
+    summary = []
+    type_names = {
+        'vocabulary': 'vocabulary terms',
+        'formula': 'mathematical formulas',
+        'problem': 'practice problems'
+    }
+    for type_key, count in counts.items():
+        if count > 0:
+            summary.append(f"{count} {type_names[type_key]}")
+
+    summary_text = ', '.join(summary[:-1])
+    if len(summary) > 1:
+        summary_text += f" and {summary[-1]}"
+    else:
+        summary_text = summary[0]
+
+    flash(f'Successfully extracted {summary_text}! Please review and select the flashcards you want to keep.', 'success')
+    return None
+
+@app.route('/upload_status/<token>', methods=['GET'])
+def upload_status(token):
+    """Report whether a background upload has finished processing"""
+    with upload_jobs_lock:
+        job = upload_jobs.get(token)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': 'Unknown upload. Please upload the file again.'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'done': job[0].done()
+    })
+
 @app.route('/review', methods=['GET'])
 def review_flashcards():
     """Show a review screen for extracted flashcards before saving them"""
-    # Get flashcards from session
-    pending_flashcards = session.get('pending_flashcards', [])
+    # Collect a background upload first (script clients pass the token explicitly)
+    token = request.args.get('token') or session.get('upload_token')
+    if token:
+        response = collect_upload(token)
+        if response is not None:
+            return response
+    
+    # Get flashcards staged for this session
+    pending_flashcards = load_pending_flashcards()
     
     if not pending_flashcards:
         flash('No flashcards to review. Please upload a PowerPoint file.', 'warning')
@@ -208,8 +494,8 @@ def save_flashcards():
         selected_indices = request.form.getlist('selected_cards')
         logger.debug(f"Selected indices: {selected_indices}")
         
-        # Get original flashcards from session
-        all_flashcards = session.get('pending_flashcards', [])
+        # Get original flashcards staged for this session
+        all_flashcards = load_pending_flashcards()
         presentation_name = session.get('presentation_name', 'custom')
         
         if not all_flashcards:
@@ -256,44 +542,48 @@ def save_flashcards():
         if selected_flashcards:
             from models import Flashcard
             
-            # First, clear any existing flashcards for this presentation if needed
-            # This ensures we only get exactly the cards we want
-            if request.form.get('clear_existing') == 'true':
-                existing = Flashcard.query.filter_by(presentation_name=presentation_name).all()
-                for card in existing:
-                    db.session.delete(card)
-                db.session.commit()
-            
-            # Prevent duplicate flashcards
-            existing_count = 0
-            new_count = 0
-            
-            for card_data in selected_flashcards:
-                # Check for exact duplicate within this presentation
-                existing = Flashcard.query.filter_by(
-                    front=card_data['front'],
-                    presentation_name=presentation_name
-                ).first()
+            # Clear, check and insert in one transaction; nothing here needs autoflush
+            with db.session.no_autoflush:
+                # First, clear any existing flashcards for this presentation if needed
+                # This ensures we only get exactly the cards we want
+                if request.form.get('clear_existing') == 'true':
+                    Flashcard.query.filter_by(presentation_name=presentation_name).delete(synchronize_session=False)
+                    existing_fronts = set()
+                else:
+                    # Prevent duplicate flashcards: fetch this presentation's fronts once
+                    existing_fronts = set(
+                        front for (front,) in db.session.query(Flashcard.front).filter_by(presentation_name=presentation_name).all()
+                    )
+                existing_count = 0
+                new_rows = []
                 
-                if existing:
-                    existing_count += 1
-                    continue
+                for card_data in selected_flashcards:
+                    # Check for exact duplicate within this presentation
+                    if card_data['front'] in existing_fronts:
+                        existing_count += 1
+                        continue
+                    
+                    # No duplicates found, proceed with creating a new flashcard
+                    existing_fronts.add(card_data['front'])
+                    new_rows.append({
+                        'type': card_data['type'],
+                        'front': card_data['front'],
+                        'back': card_data['back'],
+                        'presentation_name': presentation_name
+                    })
                 
-                # No duplicates found, proceed with creating a new flashcard
-                card = Flashcard()
-                card.type = card_data['type']
-                card.front = card_data['front']
-                card.back = card_data['back']
-                card.presentation_name = presentation_name
-                db.session.add(card)
-                new_count += 1
+                db.session.bulk_insert_mappings(Flashcard, new_rows)
+                new_count = len(new_rows)
+                
+                # Clear pending batch
+                clear_pending_flashcards()
             
             db.session.commit()
-            logger.debug(f"Saved {new_count} new flashcards to database (skipped {existing_count} duplicates)")
             
-            # Clear session data
-            session.pop('pending_flashcards', None)
+            # Clear session data only once the save has committed
+            session.pop('pending_batch', None)
             session.pop('presentation_name', None)
+            logger.debug(f"Saved {new_count} new flashcards to database (skipped {existing_count} duplicates)")
             
             # Redirect to index with success message
             if existing_count > 0:
@@ -306,6 +596,7 @@ def save_flashcards():
             return redirect(url_for('index'))
     
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error saving flashcards: {str(e)}")
         flash(f'Error saving flashcards: {str(e)}', 'error')
         return redirect(url_for('review_flashcards'))
@@ -326,21 +617,8 @@ def generate_ai_cards():
         generated_cards = generate_topic_flashcards(topic)
         
         if generated_cards:
-            # Get pending flashcards from session and update
-            pending_flashcards = session.get('pending_flashcards', [])
-            
-            # Trim any long definitions to prevent session cookie limit
-            for card in generated_cards:
-                # Limit the size of 'back' (definition/answer) to 300 chars if needed
-                if len(card['back']) > 300:
-                    card['back'] = card['back'][:297] + '...'
-            
-            # Find where to insert the new cards
-            current_length = len(pending_flashcards)
-            # Add the new cards
-            pending_flashcards.extend(generated_cards)
-            # Update session
-            session['pending_flashcards'] = pending_flashcards
+            # Append the new cards to this session's pending batch
+            add_pending_flashcards(generated_cards)
             
             # Return success response with the new cards
             return jsonify({
@@ -354,6 +632,7 @@ def generate_ai_cards():
                 'message': f'Could not generate flashcards about "{topic}". Please try a different topic.'
             })
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error generating AI flashcards: {str(e)}")
         return jsonify({
             'success': False,
@@ -363,19 +642,22 @@ def generate_ai_cards():
 @app.route('/download')
 def download_flashcards():
     from models import Flashcard
-    # Get all flashcards from the database
-    all_flashcards = [card.to_dict() for card in Flashcard.query.all()]
-
-    if not all_flashcards:
+    # Check there is something to download before starting the response
+    if db.session.query(Flashcard.id).first() is None:
         flash('No flashcards available to download', 'error')
         return render_template('index.html')
 
-    # Create a JSON file with the flashcards
-    filename = '/tmp/flashcards.json'
-    with open(filename, 'w') as f:
-        json.dump(all_flashcards, f)
+    def generate():
+        # Stream the JSON array card by card instead of building it in memory
+        # (plain column rows, so no ORM instance is built per card)
+        rows = db.session.query(Flashcard.type, Flashcard.front, Flashcard.back).yield_per(1000)
+        yield '['
+        for i, (card_type, front, back) in enumerate(rows):
+            yield (', ' if i else '') + json.dumps({'type': card_type, 'front': front, 'back': back})
+        yield ']'
 
-    return send_file(filename, as_attachment=True, download_name='flashcards.json')
+    return Response(stream_with_context(generate()), mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=flashcards.json'})
     
 @app.route('/reset_all', methods=['GET'])
 def reset_all():
@@ -385,9 +667,10 @@ def reset_all():
         session.clear()
         
         # Clear database
-        from models import Flashcard
+        from models import Flashcard, PendingFlashcard
         count = Flashcard.query.count()
         Flashcard.query.delete()
+        PendingFlashcard.query.delete()
         db.session.commit()
         
         flash(f'System reset complete! Cleared {count} flashcards and all session data.', 'success')
@@ -420,16 +703,19 @@ def delete_presentation_flashcards(presentation_name):
     try:
         from models import Flashcard
         
-        # Count cards to delete for this presentation
-        count = Flashcard.query.filter_by(presentation_name=presentation_name).count()
+        # Delete cards for this presentation; delete() reports how many rows went
+        count = Flashcard.query.filter_by(presentation_name=presentation_name).delete(synchronize_session=False)
+        
+        # Clear pending batch if it matches this presentation
+        clear_session = 'presentation_name' in session and session['presentation_name'] == presentation_name
+        if clear_session:
+            clear_pending_flashcards()
         
-        # Delete cards for this presentation
-        Flashcard.query.filter_by(presentation_name=presentation_name).delete()
         db.session.commit()
         
-        # Clear session data if it matches this presentation
-        if 'presentation_name' in session and session['presentation_name'] == presentation_name:
-            session.pop('pending_flashcards', None)
+        # Clear session data only once the delete has committed
+        if clear_session:
+            session.pop('pending_batch', None)
             session.pop('presentation_name', None)
         
         flash(f'Successfully deleted {count} flashcards from "{presentation_name}"!', 'success')
@@ -446,47 +732,24 @@ def remove_duplicates():
     try:
         from models import Flashcard
         
-        # Get all presentations
-        presentations = db.session.query(Flashcard.presentation_name).distinct().all()
-        presentations = [p[0] for p in presentations]
-        
-        total_removed = 0
-        
         # First, let's remove exact duplicates across the entire database
         # This will handle duplicates regardless of presentation name, date, or ID
-        all_cards = Flashcard.query.all()
-        
-        # Track unique content
-        seen_cards = {}  # key: (front + back + type), value: card
-        
-        for card in all_cards:
-            # Create a key based on content only
-            content_key = f"{card.front.strip()}|{card.back.strip()}|{card.type.strip()}"
-            
-            if content_key in seen_cards:
-                # This is a duplicate based on content
-                db.session.delete(card)
-                total_removed += 1
-            else:
-                seen_cards[content_key] = card
+        # (keep the oldest row of each front + back + type group)
+        keep_ids = db.session.query(func.min(Flashcard.id)).group_by(
+            strip_sql(Flashcard.front), strip_sql(Flashcard.back), strip_sql(Flashcard.type)
+        )
+        total_removed = db.session.query(Flashcard).filter(
+            Flashcard.id.not_in(keep_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
         
         # Then, perform presentation-specific deduplication
-        for presentation in presentations:
-            # Find all cards remaining for this presentation
-            cards = Flashcard.query.filter_by(presentation_name=presentation).all()
-            
-            # Track unique card fronts (titles) within this presentation
-            unique_fronts = {}
-            
-            for card in cards:
-                # If we've already seen this front (term) in this presentation, keep only the first one
-                if card.front in unique_fronts:
-                    # Delete this duplicate
-                    db.session.delete(card)
-                    total_removed += 1
-                else:
-                    # First time seeing this front, remember it
-                    unique_fronts[card.front] = card
+        # If we've already seen this front (term) in a presentation, keep only the first one
+        keep_ids = db.session.query(func.min(Flashcard.id)).group_by(
+            Flashcard.presentation_name, Flashcard.front
+        )
+        total_removed += db.session.query(Flashcard).filter(
+            Flashcard.id.not_in(keep_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
         
         db.session.commit()
         flash(f'Successfully removed {total_removed} duplicate flashcards!', 'success')
@@ -10,9 +10,29 @@ class Flashcard(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     presentation_name = db.Column(db.String(255))  # to group cards by presentation
 
+    __table_args__ = (
+        db.Index('ix_flashcard_presentation_name', 'presentation_name'),
+        db.Index('ix_flashcard_created_at', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             'type': self.type,
             'front': self.front,
             'back': self.back
         }
+
+
+class PendingFlashcard(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(32), nullable=False)  # token kept in the session
+    idx = db.Column(db.Integer, nullable=False)  # position within the batch, used by the review form
+    type = db.Column(db.String(20), nullable=False)
+    front = db.Column(db.Text, nullable=False)
+    back = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # for pruning abandoned batches
+
+    __table_args__ = (
+        # Also serves batch lookups through its leading column
+        db.Index('ix_pending_flashcard_batch_idx', 'batch_id', 'idx', unique=True),
+    )